@@ -2,13 +2,43 @@
 import numpy as np
 import cv2
 
-from statistics import mean
 import os
-import csv
-from scipy import ndimage
-from sklearn.cluster import KMeans
 import pandas as pd
-from os.path import exists
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    # numba is optional; check_symmetry falls back to the NumPy splits
+    HAVE_NUMBA = False
+
+# Reused across calls to process_images_with_masks. CLAHE objects keep
+# per-call buffers, so each thread gets its own (see _get_clahe)
+_thread_local = threading.local()
+_MORPH_K3 = np.ones((3, 3), np.uint8)
+
+# 4-connected brush for the erosion in check_symmetry
+_MORPH_CROSS3 = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+# Asymmetry ratio bounds between symmetry levels 1, 2 and 3
+_SYM_THRESHOLDS = np.array([0.1, 0.3])
+
+# Define color ranges for each shade, used by color_analysis
+_COLOR_RANGES = {
+    name: (np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8))
+    for name, (lower, upper) in {
+        'white': ([0, 0, 150], [180, 50, 255]),  # HSV range for white
+        'red': ([0, 50, 50], [5, 255, 255]),  # HSV range for red (lower range)
+        'red2': ([170, 50, 50], [180, 255, 255]),  # HSV range for red (upper range)
+        'light_brown': ([10, 50, 50], [30, 255, 255]),  # HSV range for light brown
+        'dark_brown': ([0, 50, 50], [20, 255, 150]),  # HSV range for dark brown
+        'blue_gray': ([90, 50, 50], [120, 255, 255]),  # HSV range for blue-gray
+        'black': ([0, 0, 0], [180, 255, 30])  # HSV range for black
+    }.items()
+}
 
 
 def extract_features(image,mask):
@@ -25,17 +55,26 @@ def extract_features(image,mask):
 
     # Initializing an array to store feature values
     num_features=4
-    features = np.zeros(num_features, dtype=np.float16)
+    features = np.zeros(num_features, dtype=np.float32)
+
+    # Color conversions shared by the feature helpers
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+
+    # Resize mask to match image size once for the image-based features
+    image_mask = mask
+    if image.shape[:2] != mask.shape:
+        image_mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
     
     # Feature 1: Assymetry
     features[0] = calculate_symmetry_level(check_symmetry(mask))
     
     # Feature 2: Colours
-    features[1] = color_analysis(image,mask)
+    features[1] = color_analysis(image,image_mask,hsv)
     
     # Feature 3: Dots and Globules
     if (features[1] >= 2):
-        features[2] = detect_dots(image,mask)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        features[2] = detect_dots(image,image_mask,gray)
     else :
         features[2] = 0
 
@@ -46,6 +85,52 @@ def extract_features(image,mask):
 
 
 
+if HAVE_NUMBA:
+
+    # Signatures are given so both functions are compiled (or loaded from
+    # the cache) once at import, specialized for the masks check_symmetry builds
+
+    @njit('int64(int64, int64)', cache=True)
+    def _abs_diff_int8(a, b):
+        # |a - b| with the int8 wrap-around of the NumPy splits in check_symmetry
+        d = (a - b) & 0xFF
+        if d == 128:
+            return -128
+        return d if d < 128 else 256 - d
+
+    # Serial and GIL-free: process_images already runs one image per thread,
+    # and a parallel=True version called from those threads left the process hanging on exit
+    @njit('float64(int8[:, ::1], float64)', nogil=True, cache=True)
+    def _sym_ratio(m, area):
+        """
+        Args:
+            m: Square C-contiguous int8 mask with even side, centered on the center of mass.
+            area: Defect area.
+
+        Returns:
+            mean asymmetry ratio over the vertical, horizontal and both diagonal axes
+        """
+        n = m.shape[0]
+        half = n // 2
+        v = 0
+        h = 0
+        dd = 0
+        ud = 0
+        for i in range(n):
+            for j in range(n):
+                px = np.int64(m[i, j])
+                # Each mismatched pair is visited once, from its first pixel
+                if j < half:
+                    v += _abs_diff_int8(px, np.int64(m[i, n - 1 - j]))
+                if i < half:
+                    h += _abs_diff_int8(px, np.int64(m[n - 1 - i, j]))
+                if j < i:
+                    dd += _abs_diff_int8(px, np.int64(m[j, i]))
+                if i + j > n - 1:
+                    ud += _abs_diff_int8(px, np.int64(m[n - 1 - j, n - 1 - i]))
+        return (v + h + dd + ud) / (2 * area)
+
+
 def check_symmetry(mask):
 
     """
@@ -61,24 +146,23 @@ def check_symmetry(mask):
     # mask = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
     # Resize mask to match image size if they don't match
 
-    area = np.sum(mask)  # defect area
-    com = ndimage.center_of_mass(mask)  # find the center of mass
+    moments = cv2.moments(mask)  # intensity moments, as np.sum and center_of_mass
+    area = moments['m00']  # defect area
+    com = (moments['m01'] / area, moments['m10'] / area)  # find the center of mass
     com = (int(com[0]), int(com[1]))  # convert coordinates to integers
 
     # Create a mask with the defect contour
-    brush = ndimage.generate_binary_structure(2, 1)  # create a brush for erosion
-    eroded = ndimage.binary_erosion(mask, brush)  # mask after erosion
+    # (zero border so pixels on the image edge count as contour)
+    eroded = cv2.erode(mask, _MORPH_CROSS3, borderType=cv2.BORDER_CONSTANT, borderValue=0)  # mask after erosion
     border = mask - eroded  # defect contour
     rows, cols = np.nonzero(border)  # find contour coordinates
-    coords = zip(rows, cols)  # collect coordinates
 
-    # Find the distance from the center of mass to each contour pixel
-    dist_list = []
-    for r, c in coords:
-        dist_list.append(int(np.sqrt((r - com[0]) ** 2 + (c - com[1]) ** 2)))  # Euclidean distance
+    # Squared distance from the center of mass to each contour pixel
+    dr = rows - com[0]
+    dc = cols - com[1]
 
     # Maximum distance from the center of mass to the mask edge + 10 pixels
-    max_dist = max(dist_list) + 10
+    max_dist = int(np.sqrt((dr * dr + dc * dc).max())) + 10
 
     # Crop the mask to a square with a side of max_dist+10 with the center at com
     r1 = com[0] - max_dist  # lower boundary for row
@@ -89,20 +173,20 @@ def check_symmetry(mask):
     # If any of the boundaries go beyond the image boundaries,
     # add empty rows/columns to the mask up to a distance of max_dist+10
     # this keeps com in the center and the mask square
-    if r1 < 0:
-        mask = np.append(np.zeros([abs(r1), mask.shape[1]]), mask, 0)
-        r2 += abs(r1)
-        r1 = 0
-    if c1 < 0:
-        mask = np.append(np.zeros([mask.shape[0], abs(c1)]), mask, 1)
-        c2 += abs(c1)
-        c1 = 0
-    if r2 > mask.shape[0]:
-        mask = np.append(mask, np.zeros([r2 - mask.shape[0], mask.shape[1]]), 0)
-        r2 = mask.shape[0]
-    if c2 > mask.shape[1]:
-        mask = np.append(mask, np.zeros([mask.shape[0], c2 - mask.shape[1]]), 1)
-        c2 = mask.shape[1]
+    pad_top = max(0, -r1)
+    pad_bottom = max(0, r2 - mask.shape[0])
+    pad_left = max(0, -c1)
+    pad_right = max(0, c2 - mask.shape[1])
+    if pad_top or pad_bottom or pad_left or pad_right:
+        # Allocate the padded mask once and copy the original into it
+        padded = np.zeros((mask.shape[0] + pad_top + pad_bottom, mask.shape[1] + pad_left + pad_right),
+                          dtype=mask.dtype)
+        padded[pad_top:pad_top + mask.shape[0], pad_left:pad_left + mask.shape[1]] = mask
+        mask = padded
+        r1 += pad_top
+        r2 += pad_top
+        c1 += pad_left
+        c2 += pad_left
 
     # Make a square around the defect
     new_mask = mask[r1:r2, c1:c2]
@@ -113,82 +197,98 @@ def check_symmetry(mask):
     if new_mask.shape[1] % 2 != 0:
         new_mask = np.append(new_mask, np.zeros([new_mask.shape[0], 1]), 1)
 
+    # Cast once; every split below works on int8 views of this copy
+    new_mask = new_mask.astype(np.int8, order='C')
+
+    if HAVE_NUMBA:
+        # Single fused pass over the square for all four axes
+        return _sym_ratio(new_mask, float(area))
+
+    # Scratch buffer shared by the four splits below
+    scratch = np.empty(new_mask.size, dtype=np.int8)
+
+    def abs_diff_sum(a, b):
+        # Sum of |a - b|, computed in the scratch buffer
+        sym = scratch[:a.size].reshape(a.shape)
+        np.subtract(a, b, out=sym)
+        np.abs(sym, out=sym)
+        return np.sum(sym)
+
     def split_vertical():
         # Check symmetry along the vertical axis (left-right)
         mask_left, mask_right = np.split(new_mask, 2, axis=1)
-        mask_left = mask_left.astype(np.int8)
-        mask_right = mask_right.astype(np.int8)
-        reflect_mask_left = np.flip(mask_left, axis=1)
-        reflect_mask_left = reflect_mask_left.astype(np.int8)
-        sym = np.abs(mask_right - reflect_mask_left)
-        ratio = 2 * np.sum(sym) / area
+        reflect_mask_left = mask_left[:, ::-1]
+        ratio = 2 * abs_diff_sum(mask_right, reflect_mask_left) / area
         return ratio
 
     def split_horizontal():
         # Check symmetry along the horizontal axis (up-down)
         mask_up, mask_down = np.split(new_mask, 2, axis=0)
-        mask_up = mask_up.astype(np.int8)
-        mask_down = mask_down.astype(np.int8)
-        reflect_mask_up = np.flip(mask_up, axis=0)
-        reflect_mask_up = reflect_mask_up.astype(np.int8)
-        sym = np.abs(mask_down - reflect_mask_up)
-        ratio = 2 * np.sum(sym) / area
+        reflect_mask_up = mask_up[::-1]
+        ratio = 2 * abs_diff_sum(mask_down, reflect_mask_up) / area
         return ratio
 
+    # Both diagonals compare the mask with its transpose: the upwards one
+    # with the transpose rotated by 180 degrees (the anti-transpose)
+    transposed = np.ascontiguousarray(new_mask.T)
+
     def split_downwards_diagonal():
         # Check symmetry along the diagonal (left-down)
-        mask_up = np.triu(new_mask)
-        mask_up = mask_up.astype(np.int8)
-        rotate_mask_up = np.transpose(mask_up)
-        rotate_mask_up = rotate_mask_up.astype(np.int8)
-        mask_down = np.tril(new_mask)
-        mask_down = mask_down.astype(np.int8)
-        sym = np.abs(mask_down - rotate_mask_up)
-        ratio = 2 * np.sum(sym) / area
+        # |M - M.T| holds each mismatched pair twice, once per triangle
+        ratio = abs_diff_sum(new_mask, transposed) / area
         return ratio
 
     def split_upwards_diagonal():
         # Check symmetry along the diagonal (left-up)
-        new_new_mask = np.flip(new_mask, axis=1)
-        mask_up = np.triu(new_new_mask)
-        mask_up = mask_up.astype(np.int8)
-        rotate_mask_up = np.transpose(mask_up)
-        rotate_mask_up = rotate_mask_up.astype(np.int8)
-        mask_down = np.tril(new_new_mask)
-        mask_down = mask_down.astype(np.int8)
-        sym = np.abs(mask_down - rotate_mask_up)
-        ratio = 2 * np.sum(sym) / area
+        ratio = abs_diff_sum(new_mask, transposed[::-1, ::-1]) / area
         return ratio
 
-    ratio = mean([split_vertical(), split_horizontal(), split_downwards_diagonal(), split_upwards_diagonal()])
+    ratio = 0.25 * (split_vertical() + split_horizontal() + split_downwards_diagonal() + split_upwards_diagonal())
     return ratio
 
 
 def calculate_symmetry_level(asymmetry_ratio):
-    if asymmetry_ratio < 0.1:
-        return 1  # symmetric
-    elif asymmetry_ratio < 0.3:
-        return 2  # symmetric along only one axis
-    else:
-        return 3  # asymmetric
+    """
+    Args:
+        asymmetry_ratio: Ratio from check_symmetry, or an array of them.
 
+    Returns:
+        1 if symmetric (< 0.1), 2 if symmetric along only one axis (< 0.3), 3 if asymmetric
+    """
+    levels = np.searchsorted(_SYM_THRESHOLDS, asymmetry_ratio, side='right') + 1
+    return int(levels) if np.ndim(levels) == 0 else levels
 
 
-def process_images_with_masks(image, mask):
+
+def _get_clahe():
+    # CLAHE instance of the calling thread
+    clahe = getattr(_thread_local, 'clahe', None)
+    if clahe is None:
+        clahe = _thread_local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def process_images_with_masks(image, mask, gray=None):
     """
     Args:
         image: The image to process.
         mask: Its mask.
+        gray: Grayscale version of the image, computed if not given.
 
     Returns:
-        image with green circles around the detected dots merged with mask
+        image with green circles around the detected dots merged with mask,
+        and the (center, radius) of each circle drawn
     """
 
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if gray is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # Resize mask to match image size if they don't match
+    if image.shape[:2] != mask.shape:
+        mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
 
     # Improve contrast with CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    equalized = clahe.apply(gray)
+    equalized = _get_clahe().apply(gray)
 
     # Apply median blur
     blur = cv2.medianBlur(equalized, 5)
@@ -198,12 +298,12 @@ def process_images_with_masks(image, mask):
                                     cv2.THRESH_BINARY_INV, 25, 8)
 
     # Morphological operations
-    kernel = np.ones((3, 3), np.uint8)
-    morphed = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1)
+    morphed = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, _MORPH_K3, iterations=1)
 
     # Find contours with area filter
     contours, _ = cv2.findContours(morphed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     larger_dot_area_threshold = 100  
+    circles = []
 
     for cnt in contours:
         area = cv2.contourArea(cnt)
@@ -216,44 +316,50 @@ def process_images_with_masks(image, mask):
                 x, y, w, h = cv2.boundingRect(cnt)
                 if x > 1 and y > 1 and (x + w) < image.shape[1] - 1 and (y + h) < image.shape[0] - 1:
                     # Draw circle for each dot
-                    cv2.circle(image, (int(x + w / 2), int(y + h / 2)), int((w + h) / 2), (0, 255, 0), 2)
-
-    # Resize mask to match image size if they don't match
-    if image.shape[:2] != mask.shape:
-        mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+                    center = (int(x + w / 2), int(y + h / 2))
+                    radius = int((w + h) / 2)
+                    cv2.circle(image, center, radius, (0, 255, 0), 2)
+                    circles.append((center, radius))
 
     # Apply mask (mask should be 255 for the regions to keep)
     result = cv2.bitwise_and(image, image, mask=mask)
 
-    return result
+    return result, circles
  
 
-def detect_dots(image,mask):
+def detect_dots(image,mask,gray=None):
 
-    image_with_dots=process_images_with_masks(image, mask)
     #Detects green circles in an image.
     
     """
     Args:
         image: The image to process.
         mask: Its mask.
+        gray: Grayscale version of the image, computed if not given.
 
     Returns:
         1 if a green circle is found, 0 otherwise.
     
     """
-    # Convert the image to HSV color space
-    hsv = cv2.cvtColor(image_with_dots, cv2.COLOR_BGR2HSV)
+    _, drawn_circles = process_images_with_masks(image, mask, gray)
+
+    # Without any circle drawn there is nothing for the Hough transform to find
+    if not drawn_circles:
+        return 0
 
-    # Define the lower and upper bounds for green color in HSV
-    lower_green = np.array([40, 50, 50], dtype="uint8")
-    upper_green = np.array([80, 255, 255], dtype="uint8")
+    # Resize mask to match image size if they don't match
+    if image.shape[:2] != mask.shape:
+        mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
 
-    # Create a mask for green pixels
-    mask = cv2.inRange(hsv, lower_green, upper_green)
+    # Draw the circles straight into a single-channel canvas cut to the lesion,
+    # instead of thresholding the green of the annotated image in HSV
+    canvas = np.zeros(image.shape[:2], dtype=np.uint8)
+    for center, radius in drawn_circles:
+        cv2.circle(canvas, center, radius, 255, 2)
+    canvas = cv2.bitwise_and(canvas, canvas, mask=mask)
 
     # Apply Hough circle transform to find circles in the mask
-    circles = cv2.HoughCircles(mask, cv2.HOUGH_GRADIENT, 1, 20,
+    circles = cv2.HoughCircles(canvas, cv2.HOUGH_GRADIENT, 1, 20,
                                 param1=50, param2=30, minRadius=10, maxRadius=200)
 
     # Check if any circles were found
@@ -310,46 +416,47 @@ def calculate_compactness(image):
 
 
 
-def color_analysis(image, mask):
+def color_analysis(image, mask, hsv_image=None):
     """
     Args:
         #image: The image to process.
         #mask: Its mask.
+        #hsv_image: HSV version of the image, computed if not given.
 
     #Returns:
         # Number of colors detected from 0 to 6
     """
     # Convert image to HSV color space
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    if hsv_image is None:
+        hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
 
-    # Define color ranges for each shade
-    color_ranges = {
-        'white': ([0, 0, 150], [180, 50, 255]),  # HSV range for white
-        'red': ([0, 50, 50], [5, 255, 255]),  # HSV range for red (lower range)
-        'red2': ([170, 50, 50], [180, 255, 255]),  # HSV range for red (upper range)
-        'light_brown': ([10, 50, 50], [30, 255, 255]),  # HSV range for light brown
-        'dark_brown': ([0, 50, 50], [20, 255, 150]),  # HSV range for dark brown
-        'blue_gray': ([90, 50, 50], [120, 255, 255]),  # HSV range for blue-gray
-        'black': ([0, 0, 0], [180, 255, 30])  # HSV range for black
-    }
+    if hsv_image.shape[:2] != mask.shape:
+        mask = cv2.resize(mask, (hsv_image.shape[1], hsv_image.shape[0]), interpolation=cv2.INTER_NEAREST)
+
+    # Nothing outside the lesion can be counted, so work on its bounding box
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or h == 0:
+        return 0
+    hsv_image = hsv_image[y:y + h, x:x + w]
+    mask = mask[y:y + h, x:x + w]
 
     color_regions = {}
     present_colors = []
 
-    for color_name, (lower, upper) in color_ranges.items():
+    for color_name, (lower, upper) in _COLOR_RANGES.items():
         
         # Create mask using the color range
-        lower = np.array(lower, dtype=np.uint8)
-        upper = np.array(upper, dtype=np.uint8)
         color_mask = cv2.inRange(hsv_image, lower, upper)
 
-
-        if color_mask.shape[:2] != mask.shape:
-            mask = cv2.resize(mask, (color_mask.shape[1], color_mask.shape[0]), interpolation=cv2.INTER_NEAREST)
-
         # Apply provided mask
         masked_color_mask = cv2.bitwise_and(color_mask, mask)
 
+        # Heuristic pre-filter: skip colors with at most 100 lesion pixels. Not exact,
+        # since contourArea includes enclosed holes, so a thin hollow outline of
+        # 100 pixels or fewer could still pass the area > 100 filter below
+        if cv2.countNonZero(masked_color_mask) <= 100:
+            continue
+
         # Find contours in the masked color mask
         contours, _ = cv2.findContours(masked_color_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
@@ -368,7 +475,51 @@ def color_analysis(image, mask):
 
 
 
-def process_images(file_data, path_image, path_mask, feature_names):
+def process_image(img_id, file_image, file_image_mask, reduced=False, skip_mismatched=False):
+    """
+    Args:
+        img_id (str): ID of the image, used in messages.
+        file_image (str): Path to the image file.
+        file_image_mask (str): Path to its mask file.
+        reduced (bool): Whether to read both at half resolution.
+        skip_mismatched (bool): Skip the image if its size differs from the mask's,
+                                instead of resizing the mask in extract_features.
+
+    Returns:
+        np.ndarray: Features of the image, or None if a file is missing, the sizes
+                    do not match (with skip_mismatched) or the mask is empty
+    """
+
+    # Check if both the image and mask files exist
+    try:
+        os.stat(file_image)
+        os.stat(file_image_mask)
+    except OSError:
+        return None
+
+    # Read the image and mask
+    if reduced:
+        im = cv2.imread(file_image, cv2.IMREAD_REDUCED_COLOR_2)
+        mask = cv2.imread(file_image_mask, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    else:
+        im = cv2.imread(file_image)
+        mask = cv2.imread(file_image_mask, cv2.IMREAD_GRAYSCALE)
+    if skip_mismatched and im.shape[:2] != mask.shape[:2]:
+        print(f"Skipping image {img_id}: Image and mask dimensions do not match.")
+        return None
+
+    # Check if the mask has any contour other than just a black background
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) == 0:
+        # Skip this image if no contours are found in the mask
+        return None
+    del contours
+
+    # Measure features; im and mask are released when this returns
+    return extract_features(im, mask)
+
+
+def process_images(file_data, path_image, path_mask, feature_names, reduced=False):
     
 
     """
@@ -380,6 +531,9 @@ def process_images(file_data, path_image, path_mask, feature_names):
         path_mask (str): Base path where the mask files are stored
         feature_names (list of str): List of the names of the features to be extracted from 
                                      each image-mask pair
+        reduced (bool): Read images and masks at half resolution, which halves the memory
+                        and work per image. The size thresholds used by the colour and dots
+                        features are in pixels, so features differ from full resolution
 
     Returns:
         pd.DataFrame: A DataFrame where each row corresponds to an image-mask pair and each 
@@ -399,40 +553,28 @@ def process_images(file_data, path_image, path_mask, feature_names):
 
 
     num_features = len(feature_names)
-    features = []
-    valid_image_ids = []
 
-    # Loop through all images (limited by num_images)
+    # Define filenames related to each image
+    file_images = [os.path.join(path_image, id) for id in image_id]
+    file_image_masks = [os.path.join(path_mask, id) for id in mask_id]
+
+    # Read the images and measure their features in parallel;
+    # OpenCV releases the GIL for the heavy work
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(process_image, image_id, file_images, file_image_masks, repeat(reduced)))
+
+    # Store the features in one array, keeping track of the valid images
     num_images = len(image_id)
-    for i in np.arange(num_images):
-
-        # Define filenames related to this image
-        file_image = path_image + os.sep + image_id[i]
-        file_image_mask = path_mask + os.sep + mask_id[i]
-
-        # Check if both the image and mask files exist
-        if exists(file_image) and exists(file_image_mask):
-            # Read the image and mask
-            im = cv2.imread(file_image)
-            mask = cv2.imread(file_image_mask, cv2.IMREAD_GRAYSCALE)
-
-            # Check if the mask has any contour other than just a black background
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if len(contours) == 0:
-                # Skip this image if no contours are found in the mask
-                continue
-            
-            # Measure features
-            x = extract_features(im, mask)
-
-            # Store in the list we created before
-            features.append(x)
-
-            # Keep track of the valid image ID
-            valid_image_ids.append(image_id[i])
-
-    # Create DataFrame from the features list and add image IDs
-    df_features = pd.DataFrame(features, columns=feature_names)
-    df_features['image_id'] = valid_image_ids
+    features = np.empty((num_images, num_features), dtype=np.float32)
+    valid = np.zeros(num_images, dtype=bool)
+    for i, x in enumerate(results):
+        if x is None:
+            continue
+        features[i] = x
+        valid[i] = True
+
+    # Create DataFrame from the features array and add image IDs
+    df_features = pd.DataFrame(features[valid], columns=feature_names)
+    df_features['image_id'] = [image_id[i] for i in np.nonzero(valid)[0]]
     return df_features
 
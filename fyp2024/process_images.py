@@ -1,18 +1,19 @@
 import os
-from os.path import exists
 import pandas as pd
 import numpy as np
 import cv2
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 
 # Importing function to extract features
-from extract_features import  extract_features
+from extract_features import  process_image
 
 #-------------------
 # Main script
 #-------------------
 
 # Defining function to process images
-def process_images(file_data, path_image, path_mask, feature_names):
+def process_images(file_data, path_image, path_mask, feature_names, reduced=False):
     
     # Defining where we will store the features
     file_features = 'features/features.xlsx'
@@ -26,43 +27,31 @@ def process_images(file_data, path_image, path_mask, feature_names):
 
 
     num_features = len(feature_names)
-    features = []
-    valid_image_ids = []
 
-    # Loop through all images (limited by num_images)
-    num_images = len(image_id)
-    for i in np.arange(num_images):
-
-        # Define filenames related to this image
-        file_image = path_image + os.sep + image_id[i]
-        file_image_mask = path_mask + os.sep + mask_id[i]
-
-        # Check if both the image and mask files exist
-        if exists(file_image) and exists(file_image_mask):
-            # Read the image and mask
-            im = cv2.imread(file_image)
-            mask = cv2.imread(file_image_mask, cv2.IMREAD_GRAYSCALE)
-            if im.shape[:2] != mask.shape[:2]:
-                print(f"Skipping image {image_id[i]}: Image and mask dimensions do not match.")
-                continue
-            # Check if the mask has any contour other than just a black background
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if len(contours) == 0:
-                # Skip this image if no contours are found in the mask
-                continue
-            
-            # Measure features
-            x = extract_features(im, mask)
+    # Define filenames related to each image
+    file_images = [os.path.join(path_image, id) for id in image_id]
+    file_image_masks = [os.path.join(path_mask, id) for id in mask_id]
 
-            # Store in the list we created before
-            features.append(x)
+    # Read the images and measure their features in parallel, skipping
+    # images whose mask has a different size;
+    # OpenCV releases the GIL for the heavy work
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(process_image, image_id, file_images, file_image_masks, repeat(reduced),
+                                    repeat(True)))
 
-            # Keep track of the valid image ID
-            valid_image_ids.append(image_id[i])
-
-    # Create DataFrame from the features list and add image IDs
-    df_features = pd.DataFrame(features, columns=feature_names)
-    df_features['image_id'] = valid_image_ids
+    # Store the features in one array, keeping track of the valid images
+    num_images = len(image_id)
+    features = np.empty((num_images, num_features), dtype=np.float32)
+    valid = np.zeros(num_images, dtype=bool)
+    for i, x in enumerate(results):
+        if x is None:
+            continue
+        features[i] = x
+        valid[i] = True
+
+    # Create DataFrame from the features array and add image IDs
+    df_features = pd.DataFrame(features[valid], columns=feature_names)
+    df_features['image_id'] = [image_id[i] for i in np.nonzero(valid)[0]]
     return df_features
 
 # Defining paths to metadata, images and their masks